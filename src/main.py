@@ -1,23 +1,25 @@
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
+from time import monotonic
 from typing import Tuple
 
+import httpx
+import orjson
 from fastapi import (
-    FastAPI, 
-    Request, 
-    HTTPException, 
+    FastAPI,
+    Request,
+    HTTPException,
     Depends,
 )
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, PlainTextResponse, RedirectResponse
 
 from x402 import (
     X402PaymentVerifier,
     PaymentRequirements
 )
 
-from paywall_html import get_paywall_html
-
 # import the helper verification function from the uxly_1shot_client package
 from uxly_1shot_client import verify_webhook
 
@@ -31,50 +33,132 @@ logging.basicConfig(
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-# read our static url from the environment
-HOST_URL = os.getenv("TUNNEL_BASE_URL")
+# read our static url plus the desired token and price for our api from the environment
+# os.environ[...] fails fast at startup if a variable is missing, whereas the old
+# str(os.getenv(...)) silently produced the literal string "None"
+try:
+    HOST_URL = os.environ["TUNNEL_BASE_URL"]
+    RECIPIENT_ADDRESS = os.environ["RECIPIENT_ADDRESS"]
+    PAYMENT_TOKEN_ADDRESS = os.environ["PAYMENT_TOKEN_ADDRESS"]
+    MAX_AMOUNT_REQUIRED = os.environ["MAX_AMOUNT_REQUIRED"]
+except KeyError as e:
+    raise RuntimeError(
+        f"Missing required environment variable: {e.args[0]}. "
+        "Set it in your environment or docker-compose.env (see example.env)."
+    ) from None
 
-# read the desired token and price for our api from the environment
-RECIPIENT_ADDRESS = str(os.getenv("RECIPIENT_ADDRESS"))
-PAYMENT_TOKEN_ADDRESS = str(os.getenv("PAYMENT_TOKEN_ADDRESS"))
-MAX_AMOUNT_REQUIRED = str(os.getenv("MAX_AMOUNT_REQUIRED"))
+# cache the public keys we look up from 1Shot API so only the first webhook per contract method
+# pays the network round-trip; entries expire after an hour in case a key is ever rotated
+PUBKEY_CACHE_TTL_SECONDS = 3600
+_pubkey_cache: dict[str, tuple[str, float]] = {}
+_pubkey_locks: dict[str, asyncio.Lock] = {}
 
-# example of a wrapper class to handle webhook verification with FastAPI
-# rather than looking up the public key from 1Shot API each time, you could store it in a database or cache
-class webhookAuthenticator:
-    def __init__(self):
-        logger.info("Webhook Authenticator initialized.")
+async def _get_public_key(contract_method_id: str) -> str:
+    """Return the webhook public key for a contract method, fetching from 1Shot API on a cache miss."""
+    cached = _pubkey_cache.get(contract_method_id)
+    if cached and (monotonic() - cached[1]) < PUBKEY_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    # take a per-key lock so a burst of webhooks for the same contract method doesn't
+    # stampede 1Shot API with duplicate lookups; the id comes from the unauthenticated
+    # request body, so the lock entry is dropped again once the fetch settles to keep
+    # attacker-chosen ids from growing the dict without bound
+    lock = _pubkey_locks.setdefault(contract_method_id, asyncio.Lock())
+    try:
+        async with lock:
+            cached = _pubkey_cache.get(contract_method_id)
+            if cached and (monotonic() - cached[1]) < PUBKEY_CACHE_TTL_SECONDS:
+                return cached[0]
 
-    async def __call__(self, request: Request):
-        try:
-            # Extract the required fields from the request
-            body = await request.json()  # Raw request body
-            signature = body.pop("signature", None)  # Pop the signature field from the body
-
-            if not signature:
-                raise HTTPException(status_code=400, detail="Signature field missing")
-            
-            # look up the contract method that generated the callback and get the public key
-            # in a production application, store the public key in a database or cache for faster access
             contract_method = await oneshot_client.contract_methods.get(
-                contract_method_id=body["data"]["transactionId"],
+                contract_method_id=contract_method_id,
             )
 
             if not contract_method.public_key:
                 raise HTTPException(status_code=400, detail="Public key not found")
 
-            # Verify the signature with the public key you stored corresponding to the contract method
-            is_valid = verify_webhook(
-                body=body,
-                signature=signature,
-                public_key=contract_method.public_key
-            )
+            _pubkey_cache[contract_method_id] = (contract_method.public_key, monotonic())
+            return contract_method.public_key
+    finally:
+        _pubkey_locks.pop(contract_method_id, None)
+
+# webhook signature checks that arrive in a burst are collected for a few milliseconds and
+# verified together in a single worker-thread dispatch, amortizing the threadpool hand-off
+# (and keeping the Ed25519 work off the event loop); each request just awaits its own future
+WEBHOOK_BATCH_WINDOW_SECONDS = 0.01
+WEBHOOK_BATCH_MAX_SIZE = 32
+_verify_queue: list[tuple[dict, str, str, asyncio.Future]] = []
+_verify_flush_task: asyncio.Task | None = None
+
+def _verify_batch(batch: list[tuple[dict, str, str, asyncio.Future]]) -> list[bool]:
+    """Verify a batch of webhook signatures in a worker thread, failing only the offenders."""
+    results = []
+    for body, signature, public_key, _ in batch:
+        try:
+            results.append(verify_webhook(body=body, signature=signature, public_key=public_key))
+        except Exception:
+            results.append(False)
+    return results
 
-            if not is_valid:
-                raise HTTPException(status_code=403, detail="Invalid signature")
-        except Exception as e:
-            logger.error(f"Error verifying webhook: {e}")
-            raise HTTPException(status_code=500, detail=f"Internal error: {e}")
+async def _flush_verify_queue():
+    global _verify_queue, _verify_flush_task
+    batch, _verify_queue = _verify_queue, []
+    if not batch:
+        return
+    results = await asyncio.to_thread(_verify_batch, batch)
+    for (_, _, _, future), is_valid in zip(batch, results):
+        if not future.done():
+            future.set_result(is_valid)
+    # entries queued while this batch was off-thread saw a not-done flush task and
+    # scheduled nothing, so reschedule here or their futures would never resolve
+    if _verify_queue:
+        _verify_flush_task = asyncio.create_task(_delayed_flush())
+
+async def _delayed_flush():
+    await asyncio.sleep(WEBHOOK_BATCH_WINDOW_SECONDS)
+    await _flush_verify_queue()
+
+async def verify_webhook_batched(body: dict, signature: str, public_key: str) -> bool:
+    """Queue a webhook signature for batched verification and wait for its result."""
+    global _verify_flush_task
+    future = asyncio.get_running_loop().create_future()
+    _verify_queue.append((body, signature, public_key, future))
+    if len(_verify_queue) >= WEBHOOK_BATCH_MAX_SIZE:
+        # a full batch flushes immediately rather than waiting out the idle window
+        await _flush_verify_queue()
+    elif _verify_flush_task is None or _verify_flush_task.done():
+        _verify_flush_task = asyncio.create_task(_delayed_flush())
+    return await future
+
+# async dependency to handle webhook verification with FastAPI; a plain async function avoids
+# the per-request __call__ dispatch of a class instance and can never fall back to the threadpool
+# the public keys are cached in-process so the hot path is pure signature verification
+async def authenticate_webhook(request: Request):
+    try:
+        # Extract the required fields from the request; parsing the raw bytes with
+        # orjson skips Starlette's stdlib json.loads path
+        raw = await request.body()
+        body = orjson.loads(raw)
+        signature = body.pop("signature", None)  # Pop the signature field from the body
+
+        if not signature:
+            raise HTTPException(status_code=400, detail="Signature field missing")
+
+        # look up the public key for the contract method that generated the callback
+        public_key = await _get_public_key(body["data"]["transactionId"])
+
+        # Verify the signature with the public key corresponding to the contract method
+        is_valid = await verify_webhook_batched(
+            body=body,
+            signature=signature,
+            public_key=public_key
+        )
+
+        if not is_valid:
+            raise HTTPException(status_code=403, detail="Invalid signature")
+    except Exception as e:
+        logger.error("Error verifying webhook: %s", e)
+        raise HTTPException(status_code=500, detail=f"Internal error: {e}")
 
 # for convenience, we are going to automatically create a contract method endpoint when we start the FastAPI server.
 # on restarts, we will check if the endpoint exists and if it does, we will skip creating it
@@ -82,6 +166,16 @@ class webhookAuthenticator:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event to check for or create a demo 1Shot API transaction endpoint."""
+    # give the 1Shot client a single pooled HTTP session for all of its API calls so the
+    # TCP+TLS handshake is amortized across requests instead of paid on every call
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100),
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+    # the AsyncClient keeps its httpx session on a private attribute; swap in our tuned one
+    oneshot_client._client = http_client
+    app.state.http_client = http_client
+
     # lets start by checking that we have an escrow wallet provisioned for our account on the Sepolia network
     # if not we will exit since we must have one to continue
     wallets = await oneshot_client.wallets.list(BUSINESS_ID, {"chain_id": "84532"})
@@ -160,10 +254,17 @@ async def lifespan(app: FastAPI):
     else:
         logger.info(f"Transaction endpoint already exists, skipping creation.")
 
+    # prefetch the contract method id so the first payment doesn't pay the lookup round-trip
+    await payment_verifier._get_method_id()
+
     yield
 
+    # close the pooled session on shutdown so keep-alive connections are torn down cleanly
+    await http_client.aclose()
+
 # create the FastAPI app and register the lifespan event
-app = FastAPI(lifespan=lifespan)
+# ORJSONResponse serializes the JSON responses (webhook acks, healthcheck) through orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 @app.get("/")
 async def root_redirect():
@@ -172,32 +273,33 @@ async def root_redirect():
     """
     return RedirectResponse(url="/premium")
 
+# instantiate the payment verifier once as a module-level singleton; the PaymentRequirements
+# model is validated and serialized a single time instead of on every request
+payment_verifier = X402PaymentVerifier(
+    network="base-sepolia",
+    pay_to_address=RECIPIENT_ADDRESS,
+    payment_asset=PAYMENT_TOKEN_ADDRESS,
+    asset_name="USDC",
+    max_amount_required=MAX_AMOUNT_REQUIRED,
+    resource=HOST_URL + "/premium",
+    resource_description="Pay in crypto for premium access to the resource",
+    display_amount=0.05, # this should match MAX_AMOUNT_REQUIRED but in dollars
+)
+
 # this is our premium access endpoint that must be paid for to receive the resource
-@app.get("/premium")
+# response_class=HTMLResponse keeps FastAPI from setting up its JSON response path for a route
+# that only ever returns HTML
+@app.get("/premium", response_class=HTMLResponse)
 async def premium_endpoint(
     request: Request,
-    settled: Tuple[bool, PaymentRequirements] = Depends(
-        X402PaymentVerifier(
-            network="base-sepolia",
-            pay_to_address=RECIPIENT_ADDRESS, 
-            payment_asset=PAYMENT_TOKEN_ADDRESS,
-            asset_name="USDC",
-            max_amount_required=MAX_AMOUNT_REQUIRED,
-            resource=HOST_URL + "/premium",
-            resource_description="Pay in crypto for premium access to the resource"
-            )
-        )
+    settled: Tuple[bool, PaymentRequirements] = Depends(payment_verifier)
 ):
     # For this demo, if the consumer is a human with a web browser, we will show them a paywall
     # where they can connect a wallet and pay for access
     if not settled[0]:
-        html_content = get_paywall_html(
-            amount=0.05, # this should match MAX_AMOUNT_REQUIRED but in dollars
-            testnet="base-sepolia",
-            payment_requirments=settled[1],
-            current_url=HOST_URL + "/premium",  # Replace with the actual URL
-        )
-        return HTMLResponse(content=html_content, status_code=402)
+        # serve the paywall bytes the verifier pre-rendered at construction;
+        # the 402 path does no templating
+        return HTMLResponse(content=payment_verifier.paywall_bytes, status_code=402)
     else:
         # Return the HTMLResponse with the embedded YouTube video
         return HTMLResponse(
@@ -206,11 +308,15 @@ async def premium_endpoint(
         )
 
 # this is the route where we will receive and authenticate webhook callbacks from 1Shot
-@app.post("/1shot", dependencies=[Depends(webhookAuthenticator())])
+@app.post("/1shot", dependencies=[Depends(authenticate_webhook)])
 async def handle_python_webhook(request: Request):
     logger.info("Webhook received.")
     return {"message": "Webhook received and signature verified"}
 
+# liveness probes hammer this route, so hand back one pre-built response object
+# instead of serializing a dict on every probe
+_HEALTHCHECK_RESPONSE = PlainTextResponse(b'{"message":"x402 demo is up!"}', media_type="application/json")
+
 @app.get('/healthcheck')
 async def root():
-    return {'message': 'x402 demo is up!'}
+    return _HEALTHCHECK_RESPONSE
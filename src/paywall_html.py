@@ -1,14 +1,20 @@
-import json
 from template import PAYWALL_TEMPLATE
 
+# split the template around </head> once at import so each render is a single
+# string concatenation instead of an O(len(template)) substring scan
+_HEAD, _TAIL = PAYWALL_TEMPLATE.split("</head>", 1)
+
 def get_paywall_html(
         amount: float,
         testnet: str,
-        payment_requirments: 'PaymentRequirements',
+        payment_requirements_json: str,
         current_url: str,
 ) -> str:
     """
     Returns the HTML for the demonstrator paywall page.
+
+    Takes the payment requirements as an already-serialized JSON string so the
+    pydantic model isn't re-serialized on every render.
     """
 
     # Create the configuration script to inject
@@ -16,7 +22,7 @@ def get_paywall_html(
     <script>
         window.x402 = {{
             amount: {amount},
-            paymentRequirements: {payment_requirments.model_dump_json()},
+            paymentRequirements: {payment_requirements_json},
             testnet: "{testnet}",
             currentUrl: "{current_url}"
         }};
@@ -24,4 +30,4 @@ def get_paywall_html(
     </script>
     """
     # Inject the configuration script into the head
-    return PAYWALL_TEMPLATE.replace("</head>", f"{config_script}\n</head>")
\ No newline at end of file
+    return f"{_HEAD}{config_script}\n</head>{_TAIL}"
@@ -1,9 +1,13 @@
-import base64
-import json
+import asyncio
+import binascii
 import logging
-from time import sleep
+import re
+from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional, Dict, Any, Tuple
+from functools import lru_cache
+from typing import List, Literal, Optional, Dict, Any, Tuple
+
+import pybase64
 
 from oneshot import (
     oneshot_client,
@@ -11,14 +15,15 @@ from oneshot import (
 )
 
 from pydantic import (
-    BaseModel, 
-    Field, 
+    BaseModel,
+    ConfigDict,
+    Field,
     field_validator,
     model_validator,
     ValidationError
 )
 from fastapi import (
-    HTTPException, 
+    HTTPException,
     Header
 )
 
@@ -26,16 +31,33 @@ logger = logging.getLogger(__name__)
 
 # Constants
 EVM_ADDRESS_REGEX = r"^0x[0-9a-fA-F]{40}$"
-MIXED_ADDRESS_REGEX = r"^0x[a-fA-F0-9]{40}|[A-Za-z0-9][A-Za-z0-9-]{0,34}[A-Za-z0-9]$"
+# the alternation is wrapped so both branches are anchored; previously only the first
+# branch was anchored at ^ and only the second at $, letting partial matches through
+MIXED_ADDRESS_REGEX = r"^(0x[a-fA-F0-9]{40}|[A-Za-z0-9][A-Za-z0-9-]{0,34}[A-Za-z0-9])$"
 HEX_ENCODED_64_BYTE_REGEX = r"^0x[0-9a-fA-F]{64}$"
 EVM_SIGNATURE_REGEX = r"^0x[0-9a-fA-F]{130}$"
 
+# compile the pattern once at import so validators run a single .match() call
+# instead of going through pydantic's per-field regex machinery
+MIXED_ADDRESS_RE = re.compile(MIXED_ADDRESS_REGEX)
+
 # Helper validators
 def is_integer(value: str) -> bool:
-    return value.isdigit() and int(value) >= 0
-
-def has_max_length(value: str, max_length: int) -> bool:
-    return len(value) <= max_length
+    # isdigit() strings can never parse negative, so no int() round-trip is needed
+    return value.isdigit()
+
+def parse_uint(value: str, max_length: int) -> int:
+    """Parse a bounded-length unsigned integer string with one scan and one int() conversion."""
+    if not (0 < len(value) <= max_length and value.isdigit()):
+        raise ValueError(f"must be an unsigned integer of at most {max_length} digits.")
+    return int(value)
+
+def check_hex_shape(value: str, hex_chars: int) -> str:
+    """Check the length and 0x prefix of a fixed-length hex string; the hex digits themselves
+    are validated by the single bytes.fromhex decode in the model validator."""
+    if len(value) != hex_chars + 2 or not value.startswith("0x"):
+        raise ValueError(f"must be a 0x-prefixed hex string of {hex_chars} hex characters.")
+    return value
 
 class SupportedNetworks(Enum):
     BASE_SEPOLIA = "base-sepolia"
@@ -54,22 +76,38 @@ class ErrorReasons(Enum):
 class PaymentSchemes(Enum):
     EXACT = "exact"
 
-class Extra(BaseModel):
+# Literal aliases used on the wire models: pydantic-core dispatches Literal values through
+# a faster path than Enum coercion and allocates no member instances; the Enum classes
+# above stay around as public constants
+SchemeType = Literal["exact"]
+X402VersionType = Literal[1]
+ErrorReasonType = Literal["insufficient_funds", "invalid_scheme", "invalid_network"]
+NetworkType = Literal["base-sepolia", "base", "avalanche-fuji", "avalanche"]
+
+# frozenset membership is an O(1) hash probe, vs the Enum _value2member_map_ walk
+SUPPORTED_NETWORKS: frozenset = frozenset(("base-sepolia", "base", "avalanche-fuji", "avalanche"))
+
+# plain data containers built from trusted in-process values; slotted dataclasses
+# skip pydantic's per-instantiation validation and keep a smaller footprint
+@dataclass(slots=True)
+class Extra:
     name: str
     version: str
 
 # x402PaymentRequirements
 class PaymentRequirements(BaseModel):
-    scheme: PaymentSchemes
-    network: SupportedNetworks  
+    model_config = ConfigDict(frozen=True, extra="forbid", strict=True, revalidate_instances="never")
+
+    scheme: SchemeType
+    network: NetworkType
     maxAmountRequired: str
     resource: str = Field(..., pattern=r"https?://[^\s/$.?#].[^\s]*$")
     description: str
     mimeType: Optional[str] = None
     outputSchema: Optional[Dict[str, Any]] = None
-    payTo: str = Field(..., pattern=MIXED_ADDRESS_REGEX)
+    payTo: str
     maxTimeoutSeconds: int
-    asset: str = Field(..., pattern=MIXED_ADDRESS_REGEX)
+    asset: str
     extra: Optional[Extra] = None
 
     @field_validator("maxAmountRequired")
@@ -78,95 +116,251 @@ class PaymentRequirements(BaseModel):
             raise ValueError("maxAmountRequired must be an integer.")
         return value
 
+    @field_validator("payTo", "asset")
+    def validate_address(cls, value):
+        if not MIXED_ADDRESS_RE.match(value):
+            raise ValueError("must be an EVM address or a valid name.")
+        return value
+
 # x402ExactEvmPayload
 class ExactEvmPayloadAuthorization(BaseModel):
-    from_: str = Field(..., pattern=EVM_ADDRESS_REGEX, alias="from")
-    to: str = Field(..., pattern=EVM_ADDRESS_REGEX)
+    model_config = ConfigDict(frozen=True, extra="forbid", strict=True, revalidate_instances="never")
+
+    from_: str = Field(..., alias="from")
+    to: str
     value: str
     validAfter: str
     validBefore: str
-    nonce: str = Field(..., pattern=HEX_ENCODED_64_BYTE_REGEX)
+    nonce: str
+
+    @field_validator("from_", "to")
+    def validate_address(cls, value):
+        return check_hex_shape(value, 40)
+
+    @field_validator("nonce")
+    def validate_nonce(cls, value):
+        return check_hex_shape(value, 64)
 
+    # parse each integer string exactly once and reuse the ints for the ordering
+    # check, instead of separate isdigit()/int() scans per field
     @model_validator(mode="after")
     def validate_values(cls, model):
-        if not (is_integer(model.value) and has_max_length(model.value, 18)):
+        if not (0 < len(model.value) <= 18 and model.value.isdigit()):
             raise ValueError("value must be an integer with a maximum length of 18.")
-        if not is_integer(model.validAfter):
-            raise ValueError("validAfter must be an integer.")
-        if not is_integer(model.validBefore):
-            raise ValueError("validBefore must be an integer.")
-        if not int(model.validAfter) < int(model.validBefore):
+        valid_after = parse_uint(model.validAfter, 20)
+        valid_before = parse_uint(model.validBefore, 20)
+        if not valid_after < valid_before:
             raise ValueError("validAfter must be less than validBefore.")
+        # decode the hex fields exactly once: the bytes both finish the validation the
+        # shape checks started and stay cached for downstream use (replay caches,
+        # signature recovery) as compact keys instead of 40/64-char strings
+        try:
+            from_bytes = bytes.fromhex(model.from_[2:])
+            to_bytes = bytes.fromhex(model.to[2:])
+            nonce_bytes = bytes.fromhex(model.nonce[2:])
+        except ValueError:
+            raise ValueError("hex fields contain non-hex characters.")
+        # bytes.fromhex skips ASCII whitespace, so the decoded length must be checked
+        # too or "0x" + 38 hex chars + 2 spaces would slip through the shape check
+        if len(from_bytes) != 20 or len(to_bytes) != 20 or len(nonce_bytes) != 32:
+            raise ValueError("hex fields contain non-hex characters.")
+        object.__setattr__(model, "_from_bytes", from_bytes)
+        object.__setattr__(model, "_to_bytes", to_bytes)
+        object.__setattr__(model, "_nonce_bytes", nonce_bytes)
         return model
 
+    @property
+    def from_bytes(self) -> bytes:
+        return self._from_bytes
+
+    @property
+    def to_bytes(self) -> bytes:
+        return self._to_bytes
+
+    @property
+    def nonce_bytes(self) -> bytes:
+        return self._nonce_bytes
+
 class ExactEvmPayload(BaseModel):
-    signature: str = Field(..., pattern=EVM_SIGNATURE_REGEX)
+    model_config = ConfigDict(frozen=True, extra="forbid", strict=True, revalidate_instances="never")
+
+    signature: str
     authorization: ExactEvmPayloadAuthorization
 
+    # the settlement call verifies the signature cryptographically, so a shape
+    # check (length + prefix + hex) is all the validation the regex was buying
+    @field_validator("signature")
+    def validate_signature(cls, value):
+        return check_hex_shape(value, 130)
+
+    @model_validator(mode="after")
+    def decode_signature(cls, model):
+        # one hex decode validates the digits and keeps the raw bytes for callers;
+        # the length check matters because bytes.fromhex skips ASCII whitespace
+        try:
+            signature_bytes = bytes.fromhex(model.signature[2:])
+        except ValueError:
+            raise ValueError("signature contains non-hex characters.")
+        if len(signature_bytes) != 65:
+            raise ValueError("signature contains non-hex characters.")
+        object.__setattr__(model, "_signature_bytes", signature_bytes)
+        return model
+
+    @property
+    def signature_bytes(self) -> bytes:
+        return self._signature_bytes
+
 # x402PaymentPayload
 class PaymentPayload(BaseModel):
-    x402Version: X402Versions
-    scheme: PaymentSchemes
+    model_config = ConfigDict(frozen=True, extra="forbid", strict=True, revalidate_instances="never")
+
+    x402Version: X402VersionType
+    scheme: SchemeType
     network: str  # Replace with the actual NetworkSchema type if available
+    # if more schemes are ever added, make this a discriminated union so pydantic routes
+    # by tag in O(1); the x402 wire payload carries no tag field of its own, so the
+    # discriminator would have to be the outer scheme value
     payload: ExactEvmPayload
 
 class UnsignedPaymentPayload(BaseModel):
     x402Version: int
-    scheme: PaymentSchemes
+    scheme: SchemeType
     network: str  # Replace with the actual NetworkSchema type if available
     payload: Dict[str, Any]  # Payload without the signature
 
 # x402VerifyResponse
-class VerifyResponse(BaseModel):
+@dataclass(slots=True)
+class VerifyResponse:
     isValid: bool
-    invalidReason: Optional[ErrorReasons]
-    payer: Optional[str] = Field(None, pattern=MIXED_ADDRESS_REGEX)
+    invalidReason: Optional[ErrorReasonType]
+    payer: Optional[str] = None
 
 # x402SettleResponse
-class SettleResponse(BaseModel):
+@dataclass(slots=True)
+class SettleResponse:
     success: bool
-    errorReason: Optional[ErrorReasons]
-    payer: Optional[str] = Field(None, pattern=MIXED_ADDRESS_REGEX)
-    transaction: str = Field(..., pattern=MIXED_ADDRESS_REGEX)
+    errorReason: Optional[ErrorReasonType]
+    transaction: str
     network: str  # Replace with the actual NetworkSchema type if available
+    payer: Optional[str] = None
 
 # x402SupportedPaymentKind
-class SupportedPaymentKind(BaseModel):
-    x402Version: X402Versions
-    scheme: PaymentSchemes
+@dataclass(slots=True)
+class SupportedPaymentKind:
+    x402Version: X402VersionType
+    scheme: SchemeType
     network: str  # Replace with the actual NetworkSchema type if available
 
 # x402SupportedPaymentKindsResponse
 class SupportedPaymentKindsResponse(BaseModel):
     kinds: List[SupportedPaymentKind]
 
+
+# build the 1Shot call params with a single attribute walk; verify and settle
+# previously each rebuilt this dict from the full payment_data attribute chain
+def _auth_params(payment_data: PaymentPayload) -> dict:
+    payload = payment_data.payload
+    authorization = payload.authorization
+    return {
+        "from": authorization.from_,
+        "to": authorization.to,
+        "value": authorization.value,
+        "validAfter": authorization.validAfter,
+        "validBefore": authorization.validBefore,
+        "nonce": authorization.nonce,
+        "signature": payload.signature,
+    }
+
+# retrying clients resend identical X-PAYMENT headers (browser reloads, SDK retries), so
+# cache the decoded payloads by header string; the models are frozen, making reuse safe
+# failed decodes raise and are therefore never cached
+@lru_cache(maxsize=1024)
+def _decode_payment_cached(payment: str) -> PaymentPayload:
+    try:
+        # Decode the base64-encoded string (pybase64 uses SIMD-accelerated decoding)
+        decoded = pybase64.b64decode(payment, validate=False)
+
+        # pydantic-core parses the JSON and validates it in one pass, so no
+        # intermediate dict is ever built
+        return PaymentPayload.model_validate_json(decoded)
+    except binascii.Error as e:
+        raise ValueError("Failed to decode or parse the payment string.") from e
+    except ValidationError as e:
+        raise ValueError("Validation failed for the payment payload.") from e
+
 # Dependency Injection class for performing x402 payment verification an processing with 1Shot API
 class X402PaymentVerifier:
     def __init__(
-            self, 
-            network: int, 
-            pay_to_address: str, 
+            self,
+            network: str,
+            pay_to_address: str,
             payment_asset: str,
             asset_name: str,
-            max_amount_required: int, 
-            resource: str, 
+            max_amount_required: int,
+            resource: str,
             resource_description: str,
             eip712_version: str = "2",
+            display_amount: float = 0.05,
         ):
-        self.payment_requirements = PaymentRequirements(
-            scheme=PaymentSchemes.EXACT,
-            network=SupportedNetworks(network),
+        # a frozenset probe still catches a bad network name up front (the old Enum call
+        # walked the member map, and the annotation wrongly said int)
+        if network not in SUPPORTED_NETWORKS:
+            raise ValueError(f"Unsupported network: {network}")
+        # the requirements are developer-provided constants, so model_construct skips the
+        # validators (untrusted wire payloads keep going through full validation)
+        self.payment_requirements = PaymentRequirements.model_construct(
+            scheme="exact",
+            network=network,
             maxAmountRequired=str(max_amount_required),
             resource=resource,
             description=resource_description,
+            mimeType=None,
+            outputSchema=None,
             payTo=pay_to_address,
             maxTimeoutSeconds=60,
             asset=payment_asset,
-            extra={
-                "name": asset_name, 
-                "version": eip712_version
-                }
+            extra=Extra(
+                name=asset_name,
+                version=eip712_version
+                )
         )
+        # serialize the requirements once at construction; the model never changes,
+        # so every 402 response can reuse the same JSON string
+        self.requirements_json = self.payment_requirements.model_dump_json()
+        # cache the protocol version value so the 402 branches skip the enum attribute chain
+        self._x402_version_value = X402Versions.V1.value
+        # the contract method id is resolved from 1Shot API once and cached for the lifetime
+        # of the verifier; the lock keeps concurrent payments from racing duplicate lookups
+        self._method_id: Optional[str] = None
+        self._method_id_lock = asyncio.Lock()
+        self._method_params = {"chain_id": "84532", "name": "Base Sepolia USDC transferWithAuthorization"}
+        # the network field is a plain string now; keep the cached alias for the paywall render
+        self._network_value: str = self.payment_requirements.network
+        # importing here keeps the large paywall template out of module import for consumers
+        # that only need the models; verifiers are built once at startup so nothing hot pays it
+        from paywall_html import get_paywall_html
+
+        # every paywall argument is an instance constant, so render the page once here and
+        # keep the encoded bytes ready for the 402 browser path
+        self.paywall_html = get_paywall_html(
+            amount=display_amount,
+            testnet=self._network_value,
+            payment_requirements_json=self.requirements_json,
+            current_url=self.payment_requirements.resource,
+        )
+        self.paywall_bytes = self.paywall_html.encode("utf-8")
+
+    async def _get_method_id(self) -> str:
+        """Look up the contract method id on first use and serve it from cache afterwards."""
+        if self._method_id is None:
+            async with self._method_id_lock:
+                if self._method_id is None:
+                    contract_methods = await oneshot_client.contract_methods.list(
+                        business_id=BUSINESS_ID,
+                        params=self._method_params
+                    )
+                    self._method_id = contract_methods.response[0].id
+        return self._method_id
 
     async def __call__(
             self, 
@@ -181,34 +375,43 @@ class X402PaymentVerifier:
                 raise HTTPException(
                     status_code=402,
                     detail={
-                        "x402Version": X402Versions.V1.value,
+                        "x402Version": self._x402_version_value,
                         "error": "X-PAYMENT header is required.",
-                        "accepts": self.payment_requirements.model_dump_json()
+                        "accepts": self.requirements_json
                     }
                 )
         
+        # kick off the (cached) contract method id lookup so its network round-trip
+        # overlaps the CPU work of decoding and validating the header
+        method_id_task = asyncio.create_task(self._get_method_id())
+
         # Example: Extract payment metadata from the header
         try:
             payment_data = self.decode_payment(x_payment)
         except ValueError as e:
+            method_id_task.cancel()
             raise HTTPException(
                 status_code=402,
                 detail={
-                    "x402Version": X402Versions.V1.value,
+                    "x402Version": self._x402_version_value,
                     "error": f"X-PAYMENT header has incorrect format: {e}.",
-                    "accepts": self.payment_requirements.model_dump_json()
+                    "accepts": self.requirements_json
                 }
             ) from e
 
+        # await the prefetch so any lookup error surfaces here; verify and settle then
+        # read the id straight from the cache
+        await method_id_task
+
         # Validate the payment using Coinbase API
         verified = await self.verify(payment_data)
         if not verified:
             raise HTTPException(
                 status_code=402,
                 detail={
-                    "x402Version": X402Versions.V1.value,
+                    "x402Version": self._x402_version_value,
                     "error": "X-PAYMENT header did not verify.",
-                    "accepts": self.payment_requirements.model_dump_json()
+                    "accepts": self.requirements_json
                 }
             )
         
@@ -220,7 +423,8 @@ class X402PaymentVerifier:
         elif status == "Failed":
             return (False, self.payment_requirements)
 
-    def decode_payment(self, payment: str) -> PaymentPayload:
+    @staticmethod
+    def decode_payment(payment: str) -> PaymentPayload:
         """
         Decodes a base64-encoded payment string, parses it as JSON, and validates it against the PaymentPayload model.
 
@@ -233,66 +437,40 @@ class X402PaymentVerifier:
         Raises:
             ValueError: If decoding, parsing, or validation fails.
         """
-        try:
-            # Decode the base64-encoded string
-            decoded = base64.b64decode(payment)
-
-            # Parse the JSON string into a dictionary
-            parsed = json.loads(decoded)
-
-            # Validate the object against the PaymentPayload model
-            validated = PaymentPayload(**parsed)
-            return validated
-        except (base64.binascii.Error, json.JSONDecodeError) as e:
-            raise ValueError("Failed to decode or parse the payment string.") from e
-        except ValidationError as e:
-            raise ValueError("Validation failed for the payment payload.") from e
+        return _decode_payment_cached(payment)
 
     async def verify(self, payment_data: PaymentPayload) -> bool:
         # Use 1Shot API to verify payment details and submit the payment transaction
-        contract_methods = await oneshot_client.contract_methods.list(
-            business_id=BUSINESS_ID,
-            params={"chain_id": "84532", "name": "Base Sepolia USDC transferWithAuthorization"}
-        )
         test_result = await oneshot_client.contract_methods.test(
-            contract_method_id=contract_methods.response[0].id,
-            params={
-                "from": payment_data.payload.authorization.from_,
-                "to": payment_data.payload.authorization.to,
-                "value": payment_data.payload.authorization.value,
-                "validAfter": payment_data.payload.authorization.validAfter,
-                "validBefore": payment_data.payload.authorization.validBefore,
-                "nonce": payment_data.payload.authorization.nonce,
-                "signature": payment_data.payload.signature
-            }
+            contract_method_id=await self._get_method_id(),
+            params=_auth_params(payment_data)
         )
         return test_result.success
     
     async def settle(self, payment_data: PaymentPayload) -> str:
         # Use 1Shot API to submit the transaction to the blockchain
-        contract_methods = await oneshot_client.contract_methods.list(
-            business_id=BUSINESS_ID,
-            params={"chain_id": "84532", "name": "Base Sepolia USDC transferWithAuthorization"}
-        )
         execution = await oneshot_client.contract_methods.execute(
-            contract_method_id=contract_methods.response[0].id,
-            params={
-                "from": payment_data.payload.authorization.from_,
-                "to": payment_data.payload.authorization.to,
-                "value": payment_data.payload.authorization.value,
-                "validAfter": payment_data.payload.authorization.validAfter,
-                "validBefore": payment_data.payload.authorization.validBefore,
-                "nonce": payment_data.payload.authorization.nonce,
-                "signature": payment_data.payload.signature
-            },
+            contract_method_id=await self._get_method_id(),
+            params=_auth_params(payment_data),
             memo="x402 payment settlement"
         )
         # since 402 is synchronous, we have to wait for the transaction to mine so we can return the premium content
-        while(True):
+        # asyncio.sleep yields to the event loop while we wait (time.sleep would stall every
+        # other request), with exponential backoff and a deadline from maxTimeoutSeconds so a
+        # stuck transaction can't hang the request forever
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.payment_requirements.maxTimeoutSeconds
+        delay = 0.5
+        while True:
             tx_execution = await oneshot_client.transactions.get(
                 transaction_id=execution.id
             )
             if (tx_execution.status == "Completed") or (tx_execution.status == "Failed"):
-                logger.info(f"Transaction execution {tx_execution.id} status: {tx_execution.status}")
+                # lazy %-formatting so the message is only built if this level is emitted
+                logger.info("Transaction execution %s status: %s", tx_execution.id, tx_execution.status)
                 return tx_execution.status
-            sleep(2)
\ No newline at end of file
+            if loop.time() >= deadline:
+                logger.warning("Transaction execution %s did not finish within %ss", execution.id, self.payment_requirements.maxTimeoutSeconds)
+                return "Failed"
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 5.0)
\ No newline at end of file